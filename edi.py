@@ -1,18 +1,30 @@
 #!/usr/bin/env python3
 
-import argparse
-import getpass
-import http.client
+from __future__ import annotations
+
+import io
 import json
 import os
 import sys
-import threading
 import time
-from typing import Dict, Any, List
+from typing import TYPE_CHECKING, Callable, Dict, Any, Iterator, List, Optional, Tuple
+
+# Modules that are not needed on every run (e.g., with --help) are imported
+# where they are used to speed up the start of Edi.
+if TYPE_CHECKING:
+    import http.client
+
+try:
+    # orjson is optional, but considerably faster than the json module
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
 
 CONFIG_PATH = os.path.expanduser("~/.config/edi/config.json")
-SESSION_FILE = os.path.expanduser("~/.config/edi/session.json")
-MODELS = [
+SESSION_FILE = os.path.expanduser("~/.config/edi/session.jsonl")
+# Session file of older versions, which stored all messages in one JSON list
+LEGACY_SESSION_FILE = os.path.expanduser("~/.config/edi/session.json")
+MODELS = (
     "Assistant",
     "Web-Search",
     "Claude-Opus-4.1",
@@ -22,12 +34,22 @@ MODELS = [
     "GPT-5-mini",
     "Gemini-2.5-Pro",
     "Grok-4",
-]
+)
+MODEL_MENU = "Available models:\n" + "\n".join(
+    f"{i + 1}: {model}" for i, model in enumerate(MODELS)
+)
 POE_API_KEY_LENGTH = 43
+CONNECT_TIMEOUT = 5  # seconds
+READ_TIMEOUT = 120  # seconds
+LOADING_INTERVAL = 0.5  # seconds
+READ_SIZE = 64 * 1024  # bytes
+# Number of most recent messages sent to the model as context
+MAX_CONTEXT_MESSAGES = 20
 WELCOME_MESSAGE = "Welcome to Edgar's delightful interface (Edi)!"
 INSTRUCTION_MESSAGE = (
     "Press Enter twice to end input.\nPress Enter on a blank line to exit."
 )
+YES_ANSWERS = frozenset(("y", "yes"))
 PROMPT_SEPARATOR = "-" * 60
 INPUT_PROMPT = "IN >>>\n"
 OUTPUT_PROMPT = f"\nOUT <<<\n{PROMPT_SEPARATOR}\n"
@@ -36,37 +58,109 @@ MessageType = Dict[str, Any]
 MessagesType = List[MessageType]
 
 
+def json_dumps(obj: Any, indent: bool = False) -> bytes:
+    """Serialize obj to UTF-8 encoded JSON, using orjson if available."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, indent=2 if indent else None).encode("utf-8")
+
+
+def json_loads(data: bytes) -> Any:
+    """Deserialize UTF-8 encoded JSON, using orjson if available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# Parsed config together with the modification time of the config file
+_config_cache: Optional[Tuple[int, Dict[str, str]]] = None
+
+
 def load_config() -> Dict[str, str]:
-    """Load the configuration from the config file."""
-    if os.path.exists(CONFIG_PATH):
-        with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
+    """
+    Load the configuration from the config file.
+    The parsed config is cached until the file is modified.
+    """
+    global _config_cache
+    try:
+        mtime = os.stat(CONFIG_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    if _config_cache is None or _config_cache[0] != mtime:
+        with open(CONFIG_PATH, "rb") as f:
+            _config_cache = (mtime, json_loads(f.read()))
+    return _config_cache[1]
 
 
 def save_config(api_key: str, model: str) -> None:
-    """Save the API key and selected model to the config file."""
+    """Save the API key and selected model to the config file, if changed."""
+    global _config_cache
     config = {
         "api_key": api_key,
         "model": model,
     }
+    if load_config() == config:
+        return
     os.makedirs(os.path.dirname(CONFIG_PATH), exist_ok=True)
-    with open(CONFIG_PATH, "w", encoding="utf-8") as f:
-        json.dump(config, f, indent=2)
+    with open(CONFIG_PATH, "wb") as f:
+        f.write(json_dumps(config, indent=True))
+    _config_cache = (os.stat(CONFIG_PATH).st_mtime_ns, config)
 
 
-def save_session(messages: MessagesType) -> None:
-    """Save the session messages to a file."""
-    with open(SESSION_FILE, "w", encoding="utf-8") as f:
-        json.dump(messages, f, indent=2)
+def save_session(messages: MessagesType, start: int) -> None:
+    """
+    Save the session messages to a file, one JSON message per line.
+    Only messages[start:] are appended, as the messages before start are
+    already saved. The file is replaced when start is 0 (new session).
+    """
+    data = b"".join(json_dumps(message) + b"\n" for message in messages[start:])
+    if start:
+        with open(SESSION_FILE, "a+b") as f:
+            # Terminate a line that was cut short by an interrupted append,
+            # so that the new messages start on a line of their own.
+            size = f.seek(0, os.SEEK_END)
+            if size:
+                f.seek(size - 1)
+                if f.read(1) != b"\n":
+                    data = b"\n" + data
+            f.write(data)
+    else:
+        # Write the new session to a temporary file first, so that the
+        # previous session is not lost if Edi is interrupted while writing.
+        tmp_file = f"{SESSION_FILE}.tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(data)
+        os.replace(tmp_file, SESSION_FILE)
 
 
 def load_session() -> MessagesType:
     """Load the session messages from a file."""
-    if os.path.exists(SESSION_FILE):
-        with open(SESSION_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
+    messages = []
+    try:
+        with open(SESSION_FILE, "rb") as f:
+            for line in f:
+                if line.isspace():
+                    continue
+                try:
+                    messages.append(json_loads(line))
+                except ValueError:
+                    # Skip a line that was cut short while appending, e.g.,
+                    # because Edi was killed, instead of losing the session.
+                    continue
+    except FileNotFoundError:
+        return load_legacy_session()
+    return messages
+
+
+def load_legacy_session() -> MessagesType:
+    """Load the session from the file of older versions and convert it."""
+    try:
+        with open(LEGACY_SESSION_FILE, "rb") as f:
+            messages = json_loads(f.read())
+    except FileNotFoundError:
+        return []
+    save_session(messages, 0)
+    return messages
 
 
 def get_user_input(prompt: str) -> str:
@@ -77,7 +171,7 @@ def get_user_input(prompt: str) -> str:
     while True:
         try:
             line = input()
-            if not line.strip():
+            if not line or line.isspace():
                 break
             lines.append(line)
         except EOFError:
@@ -86,24 +180,34 @@ def get_user_input(prompt: str) -> str:
     return "\n".join(lines)
 
 
+def api_key_error(api_key: str) -> Optional[str]:
+    """Return why the API key is invalid or None if it is valid."""
+    if len(api_key) != POE_API_KEY_LENGTH:
+        return f"Invalid API key length. Expected {POE_API_KEY_LENGTH} characters."
+    if not api_key.isascii():
+        return "Invalid API key. Expected ASCII characters only."
+    return None
+
+
 def get_api_key() -> str:
     """Get the API key from the user, masking the input."""
+    import getpass
+
     while True:
         api_key = getpass.getpass(
             "Enter your Poe API key.\n"
             "No characters will be displayed as you type.\n"
             "Press Enter when done.\n"
         )
-        if len(api_key) == POE_API_KEY_LENGTH:
+        error = api_key_error(api_key)
+        if error is None:
             return api_key
-        print(f"Invalid API key length. Expected {POE_API_KEY_LENGTH} characters.")
+        print(error)
 
 
 def get_model() -> str:
     """Get the Poe.com model/bot from the user."""
-    print("Available models:")
-    for i, model in enumerate(MODELS):
-        print(f"{i + 1}: {model}")
+    print(MODEL_MENU)
 
     model_choice = int(input("Select a model by number: ")) - 1
     if 0 <= model_choice < len(MODELS):
@@ -112,47 +216,231 @@ def get_model() -> str:
     return MODELS[0]
 
 
-def show_loading_dots(loading: List[bool], omit_print: bool) -> None:
-    """Show loading dots while waiting for the model response."""
-    if omit_print:
-        # Printing that loading the message output is in progress is only
-        # relevant when the user is interacting with the CLI.
-        return
-    print("\nLoading", end="", flush=True)
-    while True:
-        for _ in range(3):
-            print(".", end="", flush=True)
-            time.sleep(0.5)
-        # loading is a List with a single bool to make the bool mutable
-        if not loading[0]:  # Check if we should stop loading
-            break
-    print()  # New line after loading complete
+def show_loading_dot() -> None:
+    """Show a loading dot while waiting for the model response."""
+    print(".", end="", flush=True)
 
 
-def chat(api_key: str, model: str, messages: MessagesType) -> MessagesType:
-    """Send chat messages (interaction history) to the Poe API and return the response."""
-    conn = http.client.HTTPSConnection("api.poe.com")
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-    }
-    payload = json.dumps(
-        {
-            "model": model,
-            "messages": messages,
-            "stream": False,
-        }
-    )
+def context_window(messages: MessagesType) -> MessagesType:
+    """
+    Return the part of the conversation that is sent to the model: the last
+    MAX_CONTEXT_MESSAGES messages and a leading system message, if any.
+    """
+    if len(messages) <= MAX_CONTEXT_MESSAGES:
+        return messages
+    pinned = messages[:1] if messages[0]["role"] == "system" else []
+    start = len(messages) - MAX_CONTEXT_MESSAGES
+    # Let the context start with a user message rather than with an answer.
+    while start < len(messages) - 1 and messages[start]["role"] != "user":
+        start += 1
+    return pinned + messages[start:]
+
+
+class ReceivedSocket(io.RawIOBase):
+    """
+    Socket for an http.client response whose first bytes were already
+    received while waiting for the response.
+    """
+
+    def __init__(self, sock: Any, received: bytes) -> None:
+        super().__init__()
+        self.sock = sock
+        self.received = received
 
-    conn.request("POST", "/v1/chat/completions", payload, headers)
-    response = conn.getresponse()
+    def readable(self) -> bool:
+        return True
 
-    if response.status != 200:
-        raise Exception(f"Error: {response.status} {response.reason}")
+    def readinto(self, buffer: Any) -> int:
+        if self.received:
+            n = min(len(buffer), len(self.received))
+            buffer[:n] = self.received[:n]
+            self.received = self.received[n:]
+            return n
+        return self.sock.recv_into(buffer)
 
-    response_data = response.read()
-    conn.close()
-    return json.loads(response_data)
+    def makefile(self, mode: str) -> io.BufferedReader:
+        return io.BufferedReader(self)
+
+
+class Client:
+    """Poe API client reusing one keep-alive HTTPS connection across chats."""
+
+    HOST = "api.poe.com"
+
+    def __init__(self, api_key: str, model: str) -> None:
+        # Header values are encoded once here instead of on every request,
+        # with the same encoding that http.client uses for str values.
+        self.headers = {
+            "Authorization": f"Bearer {api_key}".encode("latin-1"),
+            "Content-Type": b"application/json",
+            "Accept-Encoding": b"gzip",
+        }
+        # Only the messages change from one request to the next.
+        self.payload: Dict[str, Any] = {
+            "model": model,
+            "messages": None,
+            "stream": True,
+        }
+        self.conn: Optional[http.client.HTTPSConnection] = None
+        # Response bytes received by _wait() that the response has to read
+        self.received = b""
+
+    def _connection(self) -> http.client.HTTPSConnection:
+        """Return the persistent connection, creating it on first use."""
+        import http.client
+
+        if self.conn is None:
+            conn = http.client.HTTPSConnection(self.HOST, timeout=CONNECT_TIMEOUT)
+            conn.connect()
+            # Model responses may take a while, so allow for more time once
+            # the connection has been established.
+            conn.sock.settimeout(READ_TIMEOUT)
+            conn.response_class = self._response
+            self.conn = conn
+        return self.conn
+
+    def _reset(self) -> None:
+        """Drop the current connection, e.g., after the server closed it."""
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        self.received = b""
+
+    def _response(
+        self, sock: Any, *args: Any, **kwargs: Any
+    ) -> http.client.HTTPResponse:
+        """Create the response, starting with the bytes received by _wait()."""
+        import http.client
+
+        if self.received:
+            sock = ReceivedSocket(sock, self.received)
+            self.received = b""
+        return http.client.HTTPResponse(sock, *args, **kwargs)
+
+    def chat(
+        self, messages: MessagesType, on_wait: Optional[Callable[[], None]] = None
+    ) -> Iterator[str]:
+        """
+        Send chat messages (interaction history) to the Poe API and return an
+        iterator over the response content as it is streamed back.
+        on_wait is called periodically while waiting for the response.
+        """
+        import http.client
+        import ssl
+
+        self.payload["messages"] = context_window(messages)
+        payload = json_dumps(self.payload)
+
+        # The server may have closed an idle keep-alive connection in the
+        # meantime, so reconnect and retry once in that case.
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request("POST", "/v1/chat/completions", payload, self.headers)
+                if on_wait is not None:
+                    self._wait(conn, on_wait)
+                response = conn.getresponse()
+                break
+            except (
+                http.client.RemoteDisconnected,
+                http.client.BadStatusLine,
+                ConnectionResetError,
+                BrokenPipeError,
+                ssl.SSLEOFError,
+            ):
+                self._reset()
+                if attempt:
+                    raise
+            except BaseException:
+                # The connection may still wait for the reply (e.g., after a
+                # timeout), so start with a fresh connection next time.
+                self._reset()
+                raise
+
+        if response.status != 200:
+            # Read the full body, so that the connection can be reused.
+            response.read()
+            if response.will_close:
+                self._reset()
+            raise Exception(f"Error: {response.status} {response.reason}")
+
+        return self._stream(response)
+
+    def _wait(
+        self, conn: http.client.HTTPSConnection, on_wait: Callable[[], None]
+    ) -> None:
+        """
+        Call on_wait every LOADING_INTERVAL until the response starts arriving.
+        Raise TimeoutError if there is no response within READ_TIMEOUT.
+        """
+        import select
+        import ssl
+
+        sock = conn.sock
+        deadline = time.monotonic() + READ_TIMEOUT
+        while time.monotonic() < deadline:
+            readable, _, _ = select.select([sock], [], [], LOADING_INTERVAL)
+            if not readable:
+                on_wait()
+                continue
+            # A readable socket may only hold TLS records without response
+            # data, e.g., session tickets sent after a TLS 1.3 handshake, so
+            # try to read response data without blocking.
+            sock.setblocking(False)
+            try:
+                self.received = sock.recv(READ_SIZE)
+                return
+            except (BlockingIOError, ssl.SSLWantReadError):
+                continue
+            finally:
+                sock.settimeout(READ_TIMEOUT)
+        raise TimeoutError("timed out")
+
+    @staticmethod
+    def _lines(response: http.client.HTTPResponse) -> Iterator[bytes]:
+        """Yield the lines of the response body, decompressing it if needed."""
+        if response.getheader("Content-Encoding", "").lower() != "gzip":
+            yield from response
+            return
+
+        import zlib
+
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)  # gzip format
+        pending = b""
+        while True:
+            data = response.read1(READ_SIZE)
+            if not data:
+                break
+            *lines, pending = (pending + decompressor.decompress(data)).split(b"\n")
+            for line in lines:
+                yield line + b"\n"
+        pending += decompressor.flush()
+        if pending:
+            yield pending
+
+    def _stream(self, response: http.client.HTTPResponse) -> Iterator[str]:
+        """Yield the content deltas of a server-sent events response."""
+        try:
+            for line in self._lines(response):
+                if not line.startswith(b"data:"):
+                    continue  # Skip blank separator lines and comments
+                data = line[len(b"data:") :].strip()
+                if data == b"[DONE]":
+                    continue  # Keep reading until the response is complete
+                chunk = json_loads(data)
+                if "error" in chunk:
+                    raise Exception(f"Error: {chunk['error']}")
+                for choice in chunk.get("choices", []):
+                    content = choice.get("delta", {}).get("content")
+                    if content:
+                        yield content
+            # Reading the (empty) rest marks a response with a Content-Length
+            # as closed, which iterating over it does not.
+            response.read()
+        finally:
+            # A partially read response leaves the connection unusable.
+            if response.will_close or not response.isclosed():
+                self._reset()
 
 
 def load_messages(continue_session: bool, omit_prompt: bool) -> MessagesType:
@@ -160,37 +448,35 @@ def load_messages(continue_session: bool, omit_prompt: bool) -> MessagesType:
     Return messages from a previous session if users wants to continue session
     or none otherwise.
     """
-    messages = []  # List to hold the conversation context
+    if not continue_session and not omit_prompt:
+        # This tool is used interactively and the flag to continue the last
+        # session was not present, so prompt the user:
+        continue_session_str = input("Continue last session? (y/n): ").strip().lower()
+        continue_session = continue_session_str in YES_ANSWERS
 
-    if continue_session:
-        # CLI argument was passed to continue session
-        messages = load_session()
+    # List to hold the conversation context
+    messages = load_session() if continue_session else []
 
     if omit_prompt:
         # This tool is not used interactively.
         #
-        message = sys.stdin.read().strip()
+        message = sys.stdin.read().rstrip()
         messages.append({"role": "user", "content": message})
         print(INPUT_PROMPT, end="", flush=True)
         print(message, end="", flush=True)
-    elif not continue_session:
-        # This tool is used interactively and the flag to continue the last
-        # session was not present, so prompt the user:
-        continue_session_str = input("Continue last session? (y/n): ").strip().lower()
-        if continue_session_str == "y":
-            messages = load_session()
 
     return messages
 
 
-def message_loop(
-    api_key: str, model: str, continue_session: bool, omit_print: bool
-) -> None:
+def message_loop(client: Client, continue_session: bool, omit_print: bool) -> None:
     """
     Implementation of the chat loop, reading user input and writing bot
     output in each iteration.
     """
     messages = load_messages(continue_session, omit_print)
+    # Number of messages already saved in the session file (the piped user
+    # message has not been saved yet)
+    saved = len(messages) - 1 if omit_print else len(messages)
 
     if not omit_print:
         print(INSTRUCTION_MESSAGE)
@@ -199,41 +485,36 @@ def message_loop(
     while True:
         if not omit_print:
             user_input = get_user_input(INPUT_PROMPT)
-            if user_input.strip() == "":
+            if not user_input or user_input.isspace():
                 break  # Exit on blank input line
             messages.append({"role": "user", "content": user_input})
-
-        # Start loading dots in a separate thread
-        # loading is a variable shared with the thread with a bool in a List to
-        # make the bool mutable
-        loading = [True]
-        loading_thread = threading.Thread(
-            target=show_loading_dots, args=(loading, omit_print)
-        )
-        loading_thread.start()
+            # Printing that loading the message output is in progress is only
+            # relevant when the user is interacting with the CLI.
+            print("\nLoading", end="", flush=True)
 
         try:
-            response_data = chat(api_key=api_key, model=model, messages=messages)
-            loading[0] = False  # Stop loading dots
-            loading_thread.join()  # Wait for loading thread to finish
-
-            choices = response_data.get("choices", [])
-            if choices:
-                print(OUTPUT_PROMPT, flush=True, end="")
-                for choice in choices:
-                    content = choice["message"].get("content", "")
-                    # Add assistant's response to messages for context
-                    messages.append({"role": "assistant", "content": content})
-                    print(content, flush=True)
-                print(PROMPT_SEPARATOR, flush=True)
-                save_session(messages)
+            stream = client.chat(
+                messages, on_wait=None if omit_print else show_loading_dot
+            )
+            if not omit_print:
+                print()  # New line after loading complete
+
+            print(OUTPUT_PROMPT, flush=True, end="")
+            content = []
+            for delta in stream:
+                print(delta, end="", flush=True)
+                content.append(delta)
+            if content:
+                print(f"\n{PROMPT_SEPARATOR}", flush=True)
+                # Add assistant's response to messages for context
+                messages.append({"role": "assistant", "content": "".join(content)})
+                save_session(messages, saved)
+                saved = len(messages)
             else:
-                print("\n<<< No response received.")
+                print("<<< No response received.")
             if omit_print:
                 break
         except Exception as e:
-            loading[0] = False  # Stop loading dots
-            loading_thread.join()  # Ensure loading thread finishes
             print(f"\n<<< Error: {e}")
             if omit_print:
                 break
@@ -241,15 +522,7 @@ def message_loop(
 
 def main() -> None:
     """Main function to run the EDI chatbot."""
-    config = load_config()
-
-    if config:
-        api_key = config["api_key"]
-        model = config["model"]
-    else:
-        api_key = get_api_key()
-        model = get_model()
-        save_config(api_key, model)
+    import argparse
 
     parser = argparse.ArgumentParser(
         description="Control EDI behavior with command line arguments."
@@ -262,6 +535,23 @@ def main() -> None:
     )
     args = parser.parse_args()
 
+    config = load_config()
+
+    if config:
+        api_key = config["api_key"]
+        model = config["model"]
+        # The key may have been saved before all checks of get_api_key()
+        # existed or edited by hand, so ask for a new one if it is invalid.
+        error = api_key_error(api_key)
+        if error is not None:
+            print(f"The API key in {CONFIG_PATH} is invalid. {error}")
+            api_key = get_api_key()
+            save_config(api_key, model)
+    else:
+        api_key = get_api_key()
+        model = get_model()
+        save_config(api_key, model)
+
     # Check if input is being piped
     omit_print = not sys.stdin.isatty()  # Omit printing if input is from a pipe
 
@@ -269,8 +559,7 @@ def main() -> None:
         print(WELCOME_MESSAGE)
 
     message_loop(
-        api_key=api_key,
-        model=model,
+        client=Client(api_key=api_key, model=model),
         continue_session=args.continue_session,
         omit_print=omit_print,
     )